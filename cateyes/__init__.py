@@ -15,7 +15,7 @@ the respective submodules.
 
 from .classification import (classify_nslr_hmm, classify_remodnav, 
                              classify_dispersion, classify_velocity,
-                             mad_velocity_thresh)
+                             mad_velocity_thresh, classify_many)
 from .utils import (discrete_to_continuous, continuous_to_discrete,
                     sfreq_to_times, coords_to_degree, pixel_to_degree, 
                     sample_data_path)
@@ -10,14 +10,17 @@ algorithms.
 
 import numpy as np
 import nslr_hmm
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
 from remodnav.clf import EyegazeClassifier
-from .utils import discrete_to_continuous, continuous_to_discrete
+from .utils import (discrete_to_continuous, continuous_to_discrete, _get_time,
+                    _discrete_to_codes, WARN_SFREQ)
 
-import warnings
-
-WARN_SFREQ = "\n\nIrregular sampling rate detected. This can lead to impaired " \
-            "performance with this classifier. Consider resampling your data to " \
-            "a fixed sampling rate. Setting sampling rate to average sample difference."
+import os
+import os.path as op
+import hashlib
+import tempfile
+import functools
+from concurrent.futures import ProcessPoolExecutor
 
 CLASSES = {nslr_hmm.FIXATION: 'Fixation',
            nslr_hmm.SACCADE: 'Saccade',
@@ -36,8 +39,62 @@ REMODNAV_SIMPLE = {"FIXA":"Fixation", "SACC":"Saccade",
                    "ISAC":"Saccade", "PURS":"Smooth Pursuit",
                    "HPSO":"PSO" , "LPSO":"PSO",
                    "IHPS":"PSO", "ILPS":"PSO"}
-    
-    
+
+CLASS_CODES = {"Fixation": 0, "Saccade": 1, "Smooth Pursuit": 2, "PSO": 3}
+
+CODE_TO_CLASS = np.array(list(CLASS_CODES), dtype=object)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_classifier(px2deg, sfreq, classifier_items):
+    """Return a REMoDNaV classifier, reusing instances with equal parameters."""
+    return EyegazeClassifier(px2deg, sfreq, **dict(classifier_items))
+
+
+def _nslr_class_table(codes):
+    """Return an object array with the name of each NSLR-HMM class code in
+    `codes` (see CLASSES). Unknown codes raise a KeyError."""
+    return np.array([CLASSES[code] for code in codes], dtype=object)
+
+
+def _hash_params(key, params):
+    """Feed `params` into the hash `key` in a canonical form. Arrays are
+    hashed by their full content (their repr abbreviates long arrays)."""
+    if isinstance(params, np.ndarray) and params.dtype != object:
+        key.update("ndarray{}{}".format(params.dtype.str, params.shape).encode())
+        key.update(np.ascontiguousarray(params).tobytes())
+    elif isinstance(params, (list, tuple, np.ndarray)):
+        key.update("{}{}(".format(type(params).__name__, len(params)).encode())
+        for param in params:
+            _hash_params(key, param)
+        key.update(b")")
+    elif isinstance(params, dict):
+        _hash_params(key, sorted(params.items()))
+    else:
+        key.update("{}:{!r};".format(type(params).__name__, params).encode())
+
+
+def _preproc_cache_file(cache_dir, data, params):
+    """Return the cache file path for preprocessed gaze data, keyed by a 
+    BLAKE2b hash of the raw data buffer and the preprocessing parameters."""
+    key = hashlib.blake2b(data.tobytes(), digest_size=16)
+    _hash_params(key, params)
+    return op.join(cache_dir, key.hexdigest() + ".npy")
+
+
+def _save_atomic(file_name, array):
+    """Save `array` to the .npy file `file_name`, such that other processes
+    never see a partially written file."""
+    fd, tmp_name = tempfile.mkstemp(dir=op.dirname(file_name), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        os.remove(tmp_name)
+        raise
+
+
 def classify_nslr_hmm(x, y, time, return_discrete=False, return_orig_output=False, **nslr_kwargs):
     """Robust gaze classification using NSLR-HMM by Pekannen & Lappi (2017).
     
@@ -97,23 +154,31 @@ def classify_nslr_hmm(x, y, time, return_discrete=False, return_orig_output=Fals
     """
     
     # extract gaze and time array
-    gaze_array = np.vstack([x, y]).T
-    time_array = np.array(time) if hasattr(time, '__iter__') else np.arange(0, len(x), 1/time)
+    gaze_array = np.empty((len(x), 2))
+    gaze_array[:, 0] = x
+    gaze_array[:, 1] = y
+    time_array, _ = _get_time(x, time, warn_sfreq=False)
+    if not time_array.flags.writeable:
+        # don't hand the shared read-only times to NSLR-HMM
+        time_array = time_array.copy()
     
     # classify using NSLR-HMM
     sample_class, seg, seg_class = nslr_hmm.classify_gaze(time_array, gaze_array,
                                                           **nslr_kwargs)
     
     # define discrete version of segments/classes
-    segments = [s.t[0] for s in seg.segments]
+    segments = np.fromiter((s.t[0] for s in seg.segments), dtype=float,
+                           count=len(seg.segments))
     classes = seg_class
     
-    # convert them if continuous series wanted
+    # convert them if continuous series wanted and name each class only once
     if return_discrete == False:
-        segments, classes = discrete_to_continuous(time_array, segments, classes)
-    
-    # add the prediction to our dataframe
-    classes = [CLASSES[i] for i in classes]
+        segments, codes, categories = _discrete_to_codes(time_array, segments, classes)
+        classes = _nslr_class_table(categories)[codes]
+    else:
+        categories, codes = np.unique(np.asarray(classes, dtype=int),
+                                      return_inverse=True)
+        classes = _nslr_class_table(categories.tolist())[codes.ravel()]
     
     if return_orig_output:
         # create dictionary from it
@@ -125,7 +190,7 @@ def classify_nslr_hmm(x, y, time, return_discrete=False, return_orig_output=Fals
     
 def classify_remodnav(x, y, time, px2deg, return_discrete=False, return_orig_output=False,
                       simple_output=False, classifier_kwargs={}, preproc_kwargs={},
-                      process_kwargs={}):
+                      process_kwargs={}, cache_dir=None, cache_regenerate=False):
     """REMoDNaV robust eye movement prediction by Dar, Wagner, & Hanke (2021).
     
     REMoDNaV is a fixation-based algorithm which is derived from the Nyström & Holmqvist 
@@ -193,6 +258,14 @@ def classify_remodnav(x, y, time, px2deg, return_discrete=False, return_orig_out
     process_kwargs : dict
         A dict consisting of keys that can be fed as keyword arguments 
         to remodnav.clf(). Default={}.
+    cache_dir : str or None
+        A directory in which REMoDNaV's preprocessed gaze data is cached. 
+        If a cache file for the same gaze data and parameters exists, it 
+        is loaded instead of preprocessing the data again. If None, the 
+        data is always preprocessed. Default=None.
+    cache_regenerate : bool
+        If True, preprocess the data again and overwrite an existing cache 
+        file. Only used if `cache_dir` is set. Default=False.
         
     Returns
     -------
@@ -201,38 +274,53 @@ def classify_remodnav(x, y, time, px2deg, return_discrete=False, return_orig_out
         times (discrete format), indicating the start of a new segment.
     classes : array of str
         The predicted class corresponding to each element in `segments`.
-    events : array
-        A record array containing the original output from REMoDNaV.
+    events : list of dict
+        The original event list returned by REMoDNaV, with one dict per 
+        event (containing e.g. "start_time", "end_time" and "label").
         Only returned if `return_orig_output = True`.
     
     """
     
     # process time argument
-    if hasattr(time, '__iter__'):
-        times = np.array(time)
-        if np.std(times[1:] - times[:-1]) > 1e-5:
-            warnings.warn(WARN_SFREQ)
-        sfreq = 1 / np.mean(times[1:] - times[:-1]) 
-    else:
-        times = np.arange(0, len(x), 1 / time)
-        sfreq = time
+    times, sfreq = _get_time(x, time)
     
     # format and preprocess the data
-    data = np.core.records.fromarrays([x, y], names=["x", "y"])
+    data = np.empty(len(x), dtype=[("x", float), ("y", float)])
+    data["x"] = x
+    data["y"] = y
+    data = data.view(np.recarray)
     
     # define the classifier, preprocess data and run the classification
-    clf = EyegazeClassifier(px2deg, sfreq, **classifier_kwargs)
-    data_preproc = clf.preproc(data, **preproc_kwargs)
+    try:
+        clf = _get_classifier(px2deg, sfreq, tuple(sorted(classifier_kwargs.items())))
+    except TypeError:
+        # unhashable classifier arguments can't be cached
+        clf = EyegazeClassifier(px2deg, sfreq, **classifier_kwargs)
+    if cache_dir is None:
+        data_preproc = clf.preproc(data, **preproc_kwargs)
+    else:
+        cache_params = (px2deg, sfreq, sorted(classifier_kwargs.items()),
+                        sorted(preproc_kwargs.items()))
+        cache_file = _preproc_cache_file(cache_dir, data, cache_params)
+        if op.exists(cache_file) and not cache_regenerate:
+            data_preproc = np.load(cache_file).view(np.recarray)
+        else:
+            data_preproc = clf.preproc(data, **preproc_kwargs)
+            os.makedirs(cache_dir, exist_ok=True)
+            _save_atomic(cache_file, data_preproc)
     events = clf(data_preproc, **process_kwargs)
     
-    # add the start time offset to the events
-    for i in range(len(events)):
-        events[i]['start_time'] += times[0]
-        events[i]['end_time'] += times[0]
-        
-    # extract the classifications
+    # add the start time offset to the events and extract the classifications
+    # in one pass (REMoDNaV returns its events as a list of dicts)
     class_dict = REMODNAV_SIMPLE if simple_output else REMODNAV_CLASSES
-    segments, classes = zip(*[(ev["start_time"], class_dict[ev["label"]]) for ev in events])
+    t_offset = times[0]
+    segments = np.empty(len(events))
+    classes = np.empty(len(events), dtype=object)
+    for i, ev in enumerate(events):
+        ev["start_time"] += t_offset
+        ev["end_time"] += t_offset
+        segments[i] = ev["start_time"]
+        classes[i] = class_dict[ev["label"]]
     
     # convert them if continuous series wanted
     if return_discrete == False:
@@ -291,40 +379,108 @@ def classify_velocity(x, y, time, threshold, return_discrete=False):
         The predicted class corresponding to each element in `segments`.
         """
     # process time argument and calculate sample threshold
-    if hasattr(time, '__iter__'):
-        times = np.array(time)
-        if np.std(times[1:] - times[:-1]) > 1e-5:
-            warnings.warn(WARN_SFREQ)
-        sfreq = 1 / np.mean(times[1:] - times[:-1]) 
-    else:
-        times = np.arange(0, len(x), 1 / time)
-        sfreq = time
+    times, sfreq = _get_time(x, time)
     sample_thresh = threshold / sfreq
     
-    # calculate movement velocities
-    gaze = np.stack([x, y])
-    vels = np.linalg.norm(gaze[:, 1:] - gaze[:, :-1], axis=0)
-    vels = np.concatenate([[0.], vels])
-    
-    # define classes by threshold
-    classes = np.empty(len(x), dtype=object)
-    classes[:] = "Fixation"
-    classes[vels > sample_thresh] = "Saccade"
+    # calculate squared movement velocities (no sqrt needed for thresholding)
+    vels_sq = np.empty(len(x))
+    vels_sq[0] = 0.
+    dx, dy = np.diff(x), np.diff(y)
+    np.multiply(dx, dx, out=vels_sq[1:])
+    vels_sq[1:] += np.multiply(dy, dy, out=dy)
     
+    # define class codes by threshold (see CLASS_CODES)
+    codes = np.full(len(x), CLASS_CODES["Fixation"], dtype=np.int8)
+    codes[vels_sq > sample_thresh ** 2] = CLASS_CODES["Saccade"]
+
     # group consecutive classes to one segment
-    segments = np.zeros(len(x), dtype=int)
-    for idx in range(1, len(classes)):
-        if classes[idx] == classes[idx - 1]:
-            segments[idx] = segments[idx - 1]
-        else:
-            segments[idx] = segments[idx - 1] + 1
+    segments = np.empty(len(x), dtype=int)
+    segments[0] = 0
+    np.cumsum(codes[1:] != codes[:-1], out=segments[1:])
     
+    # only translate the class codes to their names for the output
+    classes = CODE_TO_CLASS[codes]
+
     # return output
     if return_discrete:
         segments, classes = continuous_to_discrete(times, segments, classes)     
     return segments, classes
     
     
+def _dispersion_kernel(x, y, threshold, n_samples):
+    """Run the I-DT window search on plain float arrays.
+    
+    Returns the segment index and the int8 class code (see CLASS_CODES)
+    of each sample.
+    """
+
+    # compute the extrema of every window of n_samples at once (indexed by
+    # the window's first sample), using O(N) running min/max filters. The
+    # filters don't handle NaNs, so these are replaced by values that never 
+    # win the comparison (NaN windows are masked below)
+    nan_mask = np.isnan(x) | np.isnan(y)
+    n_windows = max(len(x) - n_samples + 1, 0)
+    first = slice(n_samples // 2, n_samples // 2 + n_windows)
+    x_mins = minimum_filter1d(np.where(nan_mask, np.inf, x), n_samples)[first]
+    x_maxs = maximum_filter1d(np.where(nan_mask, -np.inf, x), n_samples)[first]
+    y_mins = minimum_filter1d(np.where(nan_mask, np.inf, y), n_samples)[first]
+    y_maxs = maximum_filter1d(np.where(nan_mask, -np.inf, y), n_samples)[first]
+    win_disp = (x_maxs - x_mins) + (y_maxs - y_mins)
+    
+    # windows containing NaNs are never fixations
+    nans = np.empty(len(x) + 1, dtype=int)
+    nans[0] = 0
+    np.cumsum(nan_mask, out=nans[1:])
+    win_disp[nans[n_samples:] - nans[:n_windows] > 0] = np.nan
+    candidates = np.flatnonzero(win_disp <= threshold)
+    
+    # per default everything is a saccade
+    segments = np.zeros(len(x), dtype=int)
+    codes = np.full(len(x), CLASS_CODES["Saccade"], dtype=np.int8)
+    
+    # set start window and segment
+    i_start = 0
+    seg_idx = 0
+    
+    while i_start < n_windows:
+        
+        # move the window point further to the next Fixation window
+        i_cand = np.searchsorted(candidates, i_start)
+        if i_cand == len(candidates):
+            segments[i_start:] = seg_idx
+            break
+        segments[i_start:candidates[i_cand]] = seg_idx
+        i_start = candidates[i_cand]
+        i_stop = i_start + n_samples
+        
+        # set the current window extrema and start a fixation segment
+        x_min, x_max = x_mins[i_start], x_maxs[i_start]
+        y_min, y_max = y_mins[i_start], y_maxs[i_start]
+        seg_idx += 1
+        
+        # as long as we're in the fixation
+        while (x_max - x_min) + (y_max - y_min) <= threshold and i_stop < len(x):
+            
+            # make the chunk larger and update the extrema with the new 
+            # sample only (NaNs propagate like in np.min/np.max)
+            i_stop += 1
+            x_new, y_new = x[i_stop - 1], y[i_stop - 1]
+            x_min = x_min if x_new >= x_min else x_new
+            x_max = x_max if x_new <= x_max else x_new
+            y_min = y_min if y_new >= y_min else y_new
+            y_max = y_max if y_new <= y_max else y_new
+        
+        # mark it
+        codes[i_start:i_stop] = CLASS_CODES["Fixation"]
+        segments[i_start:i_stop] = seg_idx
+        
+        # start looking at a new chunk
+        i_start = i_stop
+        seg_idx += 1
+    
+    return segments, codes
+
+
 def classify_dispersion(x, y, time, threshold, window_len, return_discrete=False):
     """I-DT dispersion algorithm from Salvucci & Goldberg (2000).
     
@@ -372,69 +528,17 @@ def classify_dispersion(x, y, time, threshold, window_len, return_discrete=False
         The predicted class corresponding to each element in `segments`.
     """
 
-    def _disp(win_x, win_y):
-        """Calculate the dispersion of a window."""
-        delta_x = np.max(win_x) - np.min(win_x)
-        delta_y =np.max(win_y) - np.min(win_y)
-        return delta_x + delta_y
-    
     # process time argument
-    if hasattr(time, '__iter__'):
-        times = np.array(time)
-        if np.std(times[1:] - times[:-1]) > 1e-5:
-            warnings.warn(WARN_SFREQ)
-        sfreq = 1 / np.mean(times[1:] - times[:-1]) 
-    else:
-        times = np.arange(0, len(x), 1 / time)
-        sfreq = time
+    times, sfreq = _get_time(x, time)
     
     # infer number of samples from windowlen
     n_samples = int(sfreq * window_len)
 
-    # per default everything is a saccade
-    segments = np.zeros(len(x), dtype=int)
-    classes = np.empty(len(x), dtype=object)
-    classes[0:] = "Saccade"
-    
-    # set start window and segment
-    i_start = 0
-    i_stop = n_samples
-    seg_idx = 0
-    
-    while i_stop <= len(x):
-        
-        # set the current window
-        win_x = x[i_start:i_stop]
-        win_y = y[i_start:i_stop]
-        
-        # if we're in a Fixation
-        if _disp(win_x, win_y) <= threshold:
-            
-            # start a fixation segment
-            seg_idx += 1
-            
-            # as long as we're in the fixation
-            while _disp(win_x, win_y) <= threshold and i_stop < len(x):
-                
-                # make the chunk larger
-                i_stop += 1
-                win_x = x[i_start:i_stop]
-                win_y = y[i_start:i_stop]
-            
-            # mark it
-            classes[i_start:i_stop] = "Fixation"
-            segments[i_start:i_stop] = seg_idx
-            
-            # start looking at a new chunk
-            i_start = i_stop
-            i_stop = i_stop + n_samples
-            seg_idx += 1
-            
-        else:
-            # move window point further
-            segments[i_start:i_stop] = seg_idx
-            i_start += 1
-            i_stop = i_start + n_samples
+    # find fixation windows and map the class codes to their names
+    segments, codes = _dispersion_kernel(np.asarray(x, dtype=float),
+                                         np.asarray(y, dtype=float),
+                                         threshold, n_samples)
+    classes = CODE_TO_CLASS[codes]
     
     # return output
     if return_discrete:
@@ -493,21 +597,14 @@ def mad_velocity_thresh(x, y, time, th_0=200, return_past_threshs=False):
     >>> segments, classes = classify_velocity(x, y, time, threshold)
     """
     # process time argument and calculate sample threshold
-    if hasattr(time, '__iter__'):
-        times = np.array(time)
-        if np.std(times[1:] - times[:-1]) > 1e-5:
-            warnings.warn(WARN_SFREQ)
-        sfreq = 1 / np.mean(times[1:] - times[:-1]) 
-    else:
-        times = np.arange(0, len(x), 1 / time)
-        sfreq = time
+    times, sfreq = _get_time(x, time)
     # get init thresh per sample
     th_0 = th_0 / sfreq
     
     # calculate movement velocities
-    gaze = np.stack([x, y])
-    vels = np.linalg.norm(gaze[:, 1:] - gaze[:, :-1], axis=0)
-    vels = np.concatenate([[0.], vels])
+    vels = np.empty(len(x))
+    vels[0] = 0.
+    np.hypot(np.diff(x), np.diff(y), out=vels[1:])
     
     # define saccade threshold by MAD
     threshs = []
@@ -516,9 +613,7 @@ def mad_velocity_thresh(x, y, time, th_0=200, return_past_threshs=False):
         threshs.append(th_0)
         angular_vel = angular_vel[angular_vel < th_0]
         median = np.median(angular_vel)
-        diff = (angular_vel - median) ** 2
-        diff = np.sqrt(diff)
-        med_abs_deviation = np.median(diff)
+        med_abs_deviation = np.median(np.abs(angular_vel - median))
         th_1 = median + 3 * 1.48 * med_abs_deviation
         # print(th_0, th_1)
         if (th_0 - th_1) > 1:
@@ -536,3 +631,72 @@ def mad_velocity_thresh(x, y, time, th_0=200, return_past_threshs=False):
         return saccade_thresh, threshs
     else:
         return saccade_thresh
+
+
+def _classify_trial(args):
+    """Classify a single trial (module level, so it can be pickled)."""
+    classifier, x, y, time, classifier_kwargs = args
+    return classifier(x, y, time, **classifier_kwargs)
+
+
+def classify_many(classifier, xs, ys, times, n_jobs=-1, **classifier_kwargs):
+    """Apply a classification algorithm to multiple trials in parallel.
+    
+    Each trial is classified independently in a separate process. Processes 
+    (instead of threads) are used, since neither REMoDNaV nor NSLR-HMM are 
+    safe to run in multiple threads and most of the work is bound by the 
+    Python interpreter.
+    
+    Parameters
+    ----------
+    classifier : callable
+        The classification function to apply, e.g. `classify_remodnav` or 
+        `classify_velocity`. Must be defined at module level, such that it 
+        can be sent to the worker processes.
+    xs : list of array of float
+        A list of 1D-arrays, each representing the x-axis of one trial's 
+        gaze data.
+    ys : list of array of float
+        A list of 1D-arrays, each representing the y-axis of one trial's 
+        gaze data. Must be the same length as `xs`.
+    times : float or list of (float, array of float)
+        Either a list containing the sampling times (or sampling rate) of 
+        each trial, or a single float/int that represents the sampling rate 
+        of all trials.
+    n_jobs : int or None
+        The number of processes to use (a positive int). If -1, use all 
+        available CPUs. If None or 1, the trials are classified 
+        sequentially in the current process. Default=-1.
+    **classifier_kwargs
+        Any additional keyword argument will be passed to `classifier` 
+        (e.g. `px2deg` or `threshold`).
+        
+    Returns
+    -------
+    results : list
+        A list containing the output of `classifier` for each trial.
+        
+    Example
+    --------
+    >>> results = classify_many(classify_velocity, xs, ys, 500., threshold=50)
+    >>> segments, classes = results[0]
+    """
+    # check arguments
+    if not hasattr(times, '__iter__'):
+        times = [times] * len(xs)
+    if not (len(xs) == len(ys) == len(times)):
+        raise ValueError("xs, ys and times must have the same length, got "
+                         "{}, {} and {}.".format(len(xs), len(ys), len(times)))
+    if n_jobs is not None and not (isinstance(n_jobs, (int, np.integer))
+                                   and (n_jobs == -1 or n_jobs >= 1)):
+        raise ValueError("n_jobs must be -1, None or a positive int, "
+                         "got {}.".format(n_jobs))
+    trials = [(classifier, x, y, time, classifier_kwargs)
+              for x, y, time in zip(xs, ys, times)]
+    
+    # classify the trials sequentially or on a process pool
+    if n_jobs is None or n_jobs == 1:
+        return [_classify_trial(trial) for trial in trials]
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    with ProcessPoolExecutor(n_jobs) as executor:
+        return list(executor.map(_classify_trial, trials))
@@ -9,7 +9,18 @@ cateyes.utils provides utility functions to convert and handle data.
 
 import numpy as np
 
+import os.path as op
+import functools
+import warnings
 
+WARN_SFREQ = "\n\nIrregular sampling rate detected. This can lead to impaired " \
+            "performance with this classifier. Consider resampling your data to " \
+            "a fixed sampling rate. Setting sampling rate to average sample difference."
+
+_DATA_DIR = op.abspath(op.join(op.dirname(__file__), "data"))
+
+
+@functools.lru_cache(maxsize=None)
 def sample_data_path(name):
     """return the static path to a CatEyes sample dataset.
     
@@ -25,10 +36,7 @@ def sample_data_path(name):
         The absolute path leading to the respective .csv file on your 
         machine.
         """
-    import os.path as op
-    data_dir = op.join(op.dirname(__file__), "data")
-    data_path = op.join(data_dir, name + ".csv")
-    return op.abspath(data_path)
+    return op.join(_DATA_DIR, name + ".csv")
 
 
 def discrete_to_continuous(times, discrete_times, discrete_values):
@@ -38,7 +46,7 @@ def discrete_to_continuous(times, discrete_times, discrete_values):
     ----------
     times : array of (float, int)
         A 1D-array representing the sampling times of the continuous 
-        eyetracking recording.
+        eyetracking recording. Must be sorted in ascending order.
     discrete_times : array of (float, int)
         A 1D-array representing discrete timepoints at which a specific
         event occurs. Is used to map `discrete_values` onto `times`.
@@ -54,30 +62,88 @@ def discrete_to_continuous(times, discrete_times, discrete_values):
         of the discrete events mapped onto the sampling times.
     values : array
         Array of length len(times) corresponding to the event values
-        or descriptions of the discrete events.
+        or descriptions of the discrete events. Samples before the first 
+        event are None. If all events are strings and no sample precedes 
+        the first event, this is a string array, else an object array.
         
     Example
     --------
     >>> times = np.array([0., 0.1, 0.2])
     >>> dis_times, dis_values = [0.1], ["Saccade"]
     >>> discrete_to_continuous(times, dis_times, dis_values)
-    array([0., 1., 1.]), array([None, 'Saccade', 'Saccade'])
+    array([0, 1, 1]), array([None, 'Saccade', 'Saccade'])
     """
     
-    # sort the discrete events by time
-    time_val_sorted = sorted(zip(discrete_times, discrete_values))
-    
-    # fill the time series with indices and values
-    indices = np.zeros(len(times))
-    values = np.empty(len(times), dtype=object)
-    for idx, (dis_time, dis_val) in enumerate(time_val_sorted):
-        selected = [times >= dis_time]
-        indices[selected] = idx + 1
-        values[selected] = dis_val
-        
+    # if every sample starts its own event, events map onto samples 1:1
+    if (len(discrete_times) == len(times) 
+            and np.array_equal(discrete_times, times)):
+        values = np.empty(len(times), dtype=object)
+        for idx, dis_val in enumerate(discrete_values):
+            values[idx] = dis_val
+        if len(values) > 0 and all(isinstance(val, str) for val in values):
+            # every sample has a string label, pack them like below
+            values = np.array(list(values))
+        return np.arange(1, len(times) + 1), values
+
+    indices, codes, categories = _discrete_to_codes(times, discrete_times,
+                                                    discrete_values)
+
+    # look up the value of each sample in the category table
+    if (len(categories) > 1 and np.all(codes != 0)
+            and all(isinstance(cat, str) for cat in categories[1:])):
+        # every sample has a string label, so no None is needed
+        values = np.array(categories[1:])[codes - 1]
+    else:
+        cat_values = np.empty(len(categories), dtype=object)
+        for code, cat in enumerate(categories):
+            cat_values[code] = cat
+        values = cat_values[codes]
+
     return indices, values
 
 
+def _discrete_to_codes(times, discrete_times, discrete_values):
+    """Like `discrete_to_continuous`, but return the values of each sample
+    as integer codes into a short list of distinct categories, such that
+    the value of sample i is `categories[codes[i]]`. Category 0 is None,
+    which marks samples before the first event."""
+
+    # sort the discrete events by time (classifier output usually already is)
+    dis_times = np.asarray(discrete_times)
+    dis_values = list(discrete_values)
+    if not np.all(dis_times[1:] >= dis_times[:-1]):
+        order = np.argsort(dis_times, kind="stable")
+        dis_times = dis_times[order]
+        dis_values = [dis_values[idx] for idx in order]
+
+    # encode the event values as category codes (keyed by type as well, 
+    # so that equal values of different types like 1, 1.0 and True stay apart)
+    categories = [None]
+    dis_codes = np.zeros(len(dis_values) + 1, dtype=np.int32)
+    try:
+        cat_codes = {(type(None), None): 0}
+        for idx, dis_val in enumerate(dis_values):
+            key = (type(dis_val), dis_val)
+            if key not in cat_codes:
+                cat_codes[key] = len(categories)
+                categories.append(dis_val)
+            dis_codes[idx + 1] = cat_codes[key]
+    except TypeError:
+        # unhashable values get a category per event
+        categories = [None] + dis_values
+        dis_codes = np.arange(len(categories), dtype=np.int32)
+
+    # count the samples before the first event and within each event
+    starts = np.searchsorted(times, dis_times, side='left')
+    counts = np.diff(np.concatenate([[0], starts, [len(times)]]))
+
+    # fill the time series with indices and codes run by run
+    indices = np.repeat(np.arange(len(counts)), counts)
+    codes = np.repeat(dis_codes, counts)
+
+    return indices, codes, categories
+
+
 def continuous_to_discrete(times, indices, values):
     """Matches an array of discrete events to a continuous time series.
     Reverse function of `discrete_to_continuous`.
@@ -104,17 +170,17 @@ def continuous_to_discrete(times, indices, values):
         corresponding to `discrete_times`. Is the same length as 
         `discrete_times`.
     """
-    
+
+    # a new event starts at the first sample and wherever the index increases
+    indices = np.asarray(indices)
+    change = np.empty(len(indices), dtype=bool)
+    change[:1] = True
+    np.greater(indices[1:], indices[:-1], out=change[1:])
+
     # fill the discrete lists with events
-    discrete_times = []
-    discrete_values = []
-    cur_idx = np.min(indices) - 1
-    for time, idx, val in zip(times, indices, values):
-        if idx > cur_idx:
-            discrete_times.append(time)
-            discrete_values.append(val)
-        cur_idx = idx
-    
+    discrete_times = np.asarray(times)[change].tolist()
+    discrete_values = np.asarray(values, dtype=object)[change].tolist()
+
     return discrete_times, discrete_values
 
 
@@ -136,7 +202,38 @@ def sfreq_to_times(gaze_array, sfreq, start_time=0):
     times : array of float
         A 1D-array representing the sampling times of the recording.
         """
-    return np.arange(0, len(gaze_array) / sfreq, 1. / sfreq) + start_time
+    return np.arange(len(gaze_array)) / sfreq + start_time
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_times(n_samples, sfreq):
+    """Return a read-only times array for `n_samples` samples at `sfreq`, 
+    shared between consecutive calls (e.g. several classifiers on one 
+    recording). Only the latest array is kept alive."""
+    times = np.arange(n_samples) / sfreq
+    times.flags.writeable = False
+    return times
+
+
+def _get_time(x, time, warn_sfreq=True):
+    """Return the sampling times and sampling rate for a gaze array, 
+    given either its sampling times or its sampling rate as `time`.
+    Warns if the sampling times are irregular and `warn_sfreq` is True.
+    Times generated from a sampling rate are shared and read-only, so 
+    callers must not modify them in place."""
+    time = np.asarray(time)
+    if time.ndim == 0:
+        sfreq = float(time)
+        return _cached_times(len(x), sfreq), sfreq
+    
+    # infer the sampling rate from the average sample difference
+    if len(time) < 2:
+        raise ValueError("At least two sampling times are required to infer "
+                         "the sampling rate, got {}.".format(len(time)))
+    diffs = np.diff(time)
+    if warn_sfreq and diffs.max() - diffs.min() > 1e-5:
+        warnings.warn(WARN_SFREQ)
+    return time, 1. / diffs.mean()
 
 
 def coords_to_degree(x, viewing_dist, screen_max, screen_min=None):
@@ -168,9 +265,16 @@ def coords_to_degree(x, viewing_dist, screen_max, screen_min=None):
     x_converted : array of float
         The gaze array converted to degrees.
     """
+    x = np.asarray(x)
+    
+    # scalar screen parameters for a 1D gaze array need no array handling
+    if (x.ndim == 1 and not hasattr(screen_max, '__len__') 
+            and not hasattr(screen_min, '__len__')):
+        coord_range = screen_max - (0 if screen_min is None else screen_min)
+        return _coords_to_degree(x, viewing_dist, coord_range)
+    
     # set default for screen min
-    x = np.array(x)
-    if screen_min == None:
+    if screen_min is None:
         screen_min = np.zeros_like(screen_max)
         
     # check arguments shapes
@@ -190,12 +294,23 @@ def coords_to_degree(x, viewing_dist, screen_max, screen_min=None):
         if lengthy and not (1 == len(screen_max) == len(screen_min)):
             raise ValueError(msg_2)
     
-    # convert the x array to degree using the arctan
-    coord_range = np.array(screen_max) - np.array(screen_min)
-    coord_range = coord_range.reshape(-1, 1)
+    # convert the x array to degree using the arctan (a 1D gaze array 
+    # only needs a single scalar range, 2D arrays one range per dimension)
+    coord_range = np.asarray(screen_max) - np.asarray(screen_min)
+    if x.ndim > 1:
+        coord_range = coord_range.reshape(-1, 1)
+    return _coords_to_degree(x, viewing_dist, coord_range)
+
+
+def _coords_to_degree(x, viewing_dist, coord_range):
+    """Conversion kernel of `coords_to_degree` without argument checks. 
+    `coord_range` must already broadcast against `x`."""
     x = x - coord_range / 2.  # 0 should be at the center
-    x = np.degrees(np.arctan2(x, viewing_dist))
-    return x
+    if np.ndim(x) == 0:
+        return np.degrees(np.arctan2(x, viewing_dist))
+    # x is a new float array here, so the arctan can be written in place
+    np.arctan2(x, viewing_dist, out=x)
+    return np.degrees(x, out=x)
 
 
 def pixel_to_degree(x, viewing_dist, screen_size, screen_res):
@@ -226,23 +341,28 @@ def pixel_to_degree(x, viewing_dist, screen_size, screen_res):
         The gaze array converted to degrees.
     """
     # check arguments shapes
-    msg_1 = "If x has more than 1 dimension, screen_res" \
+    msg_1 = "If x has more than 1 dimension, {}" \
     " must be an iterable object with the same length as x."
-    msg_2 = "Multiple screen_res dimensions " \
+    msg_2 = "Multiple {} dimensions " \
     "were passed for only one gaze series x."
-    x = np.array(x)
-    lengthy = hasattr(screen_res, '__len__')
-    if x.ndim > 1:
-        if (not lengthy) or (lengthy and len(x) != len(screen_res)):
-            raise ValueError(msg_1)
-    else:
-        if lengthy and len(screen_max) != 1:
-            raise ValueError(msg_2)
+    x = np.asarray(x)
+    for name, param in [("screen_size", screen_size), ("screen_res", screen_res)]:
+        lengthy = hasattr(param, '__len__')
+        if x.ndim > 1:
+            if (not lengthy) or (lengthy and len(x) != len(param)):
+                raise ValueError(msg_1.format(name))
+        else:
+            if lengthy and len(param) != 1:
+                raise ValueError(msg_2.format(name))
 
-    # convert from pixels to spatial unit
-    screen_size = np.array(screen_size).reshape(-1, 1)
-    screen_res = np.array(screen_res).reshape(-1, 1)
-    x = x / screen_res * screen_size
+    # convert from pixels to spatial unit with one precomputed factor per 
+    # gaze dimension (a single value for 1D gaze arrays)
+    screen_size = np.asarray(screen_size).reshape(-1, 1)
+    factor = screen_size / np.asarray(screen_res).reshape(-1, 1)
+    if x.ndim == 1:
+        screen_size, factor = screen_size.ravel(), factor.ravel()
+    x = x * factor
     
-    # convert the spatial coordinates to degree
-    return coords_to_degree(x, viewing_dist, screen_size)
+    # convert the spatial coordinates to degree (screen_size and screen_res 
+    # shapes are checked above)
+    return _coords_to_degree(x, viewing_dist, screen_size)
@@ -11,6 +11,9 @@ Eyetracking data.
 import numpy as np
 import nslr_hmm
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PatchCollection
+from matplotlib.colors import to_rgba
+from matplotlib.patches import FancyArrow
 
 COLORS = {nslr_hmm.FIXATION: 'blue',
           nslr_hmm.SACCADE: 'black',
@@ -28,6 +31,26 @@ N_COLS = {'Fixation': 'blue',
           'Low-Velocity PSO (ISI)': 'yellowgreen',
           'None':'grey',}
 
+# classes plotted as straight lines (or arrows) by plot_trajectory
+CLEAN_CLASSES = frozenset(['Fixation', 'Saccade', 'ISaccade'])
+ARROW_CLASSES = frozenset(['Saccade', 'ISaccade'])
+
+# plt.plot() keyword arguments that mean the same for a LineCollection
+COLLECTION_LINE_KWARGS = frozenset(['linewidth', 'lw', 'linestyle', 'ls', 'zorder',
+                                    'label', 'antialiased', 'aa', 'rasterized'])
+
+
+def _add_event_lines(ax, event_times):
+    """Add dashed vertical bars at `event_times` to `ax` as a single 
+    collection, spanning the full axis height like axvline."""
+    ax.add_collection(LineCollection([[(time, 0), (time, 1)] for time in event_times],
+                                     linestyles="--", colors='#1f77b4',
+                                     transform=ax.get_xaxis_transform()),
+                      autolim=False)
+    if len(event_times) > 0:
+        ax.dataLim.update_from_data_x(event_times, ignore=False)
+        ax.autoscale_view(scaley=False)
+
 
 def plot_segmentation(gaze, times, segments=None, events=None, show_event_text=True,
                       color_dict=None, show_legend=True, ax=None):
@@ -81,23 +104,29 @@ def plot_segmentation(gaze, times, segments=None, events=None, show_event_text=T
     
     """
     
-    if ax == None:
+    if ax is None:
         ax = plt.gca()
         
-    if color_dict == None:
+    if color_dict is None:
         color_dict = N_COLS
     
-    if segments == None:
+    if segments is None:
         ax.plot(times, gaze)
         
         # define the values for our legend
         color_dict = {"Gaze":"blue"}
     else:
-        # add multiple plot lines for each segment
-        zip_seg = zip(segments[0][:-1], segments[0][1:], segments[1][:-1])
-        for start, stop, cl in zip_seg:
-            select = np.logical_and(times >= start, times <= stop)
-            ax.plot(times[select], gaze[select], "-", c=color_dict[cl])
+        # add a line for each segment (from start to stop time), drawn 
+        # together as a single collection
+        starts = np.searchsorted(times, segments[0][:-1], side="left")
+        stops = np.searchsorted(times, segments[0][1:], side="right")
+        lines, colors = [], []
+        for start, stop, cl in zip(starts, stops, segments[1][:-1]):
+            if stop > start:
+                lines.append(np.column_stack([times[start:stop], gaze[start:stop]]))
+                colors.append(color_dict[cl])
+        ax.add_collection(LineCollection(lines, colors=colors))
+        ax.autoscale_view()
         
         # define the values for our legend
         color_dict = {key:val for key, val in color_dict.items() if key in segments[1]}
@@ -106,14 +135,15 @@ def plot_segmentation(gaze, times, segments=None, events=None, show_event_text=T
     leg_artists = [plt.Line2D((0,1),(0,0), color=color) for color in color_dict.values()]
     leg_indicators = list(color_dict.keys())
             
-    if events != None:
+    if events is not None:
         # add vertical bars at timepoints listed in events
         y_pos = ax.get_ylim()[0]
-        x_pos = np.diff(ax.get_xlim()) / 200  # np.mean(times[1:] - times[:-1]) * 30
-        for time, val in zip(events[0], events[1]):
-            ax.axvline(x=float(time), linestyle="--")
-            if show_event_text:
-                ax.text(float(time) + x_pos, y_pos, f" {val}", rotation=90,
+        x_pos = np.diff(ax.get_xlim())[0] / 200  # np.mean(times[1:] - times[:-1]) * 30
+        event_times = np.asarray(events[0], dtype=float)
+        _add_event_lines(ax, event_times)
+        if show_event_text:
+            for time, val in zip(event_times, events[1]):
+                ax.text(time + x_pos, y_pos, f" {val}", rotation=90,
                         verticalalignment='bottom', color='#1f77b4')
         
         # add legend artists for the events
@@ -205,40 +235,60 @@ def plot_trajectory(x, y, times, segments=None, color_dict=None, show_legend=Tru
     if "head_width" not in arrow_kwargs.keys():
         arrow_kwargs["head_width"] = 0.1
     
-    if ax == None:
+    if ax is None:
         ax = plt.gca()
         
-    if color_dict == None:
+    if color_dict is None:
         color_dict = N_COLS
     
-    if segments == None:
+    if segments is None:
         ax.plot(x, y, **plot_kwargs)
         
         # define the values for our legend
         color_dict = {"Gaze":"blue"}
     else:
-        # add multiple plot lines for each segment
-        zip_seg = zip(segments[0][:-1], segments[0][1:], segments[1][:-1])
+        # collect a line or arrow for each segment (from start to stop time),
+        # so all of them can be drawn as one collection each
+        starts = np.searchsorted(times, segments[0][:-1], side="left")
+        stops = np.searchsorted(times, segments[0][1:], side="right")
+        classes = segments[1][:-1]
+        colors = [color_dict[cl] for cl in classes]
+        lines, line_colors, arrows = [], [], []
         alpha = 1
-        for start, stop, cl in reversed(list(zip_seg)):
-            select = np.logical_and(times >= start, times <= stop)
-            x_sel = x[select]
-            y_sel = y[select]
-            if show_clean and cl in ['Fixation', 'Saccade', 'ISaccade'] and len(x_sel) > 0:
-                if show_arrows and cl in ['Saccade', 'ISaccade']:
-                    ax.arrow(x_sel[0], y_sel[0], x_sel[-1] - x_sel[0], y_sel[-1] - y_sel[0],
-                             color=color_dict[cl], length_includes_head=True, alpha=alpha,
-                             **arrow_kwargs)
+        for k in range(len(colors) - 1, -1, -1):
+            start, stop, cl, color = starts[k], stops[k], classes[k], colors[k]
+            x_sel = x[start:stop]
+            y_sel = y[start:stop]
+            if len(x_sel) == 0:
+                continue
+            if show_clean and cl in CLEAN_CLASSES:
+                if show_arrows and cl in ARROW_CLASSES:
+                    arrows.append(FancyArrow(x_sel[0], y_sel[0], x_sel[-1] - x_sel[0],
+                                             y_sel[-1] - y_sel[0], color=color,
+                                             length_includes_head=True, alpha=alpha,
+                                             **arrow_kwargs))
                 else:
-                    ax.plot([x_sel[0], x_sel[-1]], [y_sel[0], y_sel[-1]],
-                            c=color_dict[cl], alpha=alpha, **plot_kwargs)
+                    lines.append([(x_sel[0], y_sel[0]), (x_sel[-1], y_sel[-1])])
+                    line_colors.append(to_rgba(color, alpha))
             else:
-                ax.plot(x_sel, y_sel, c=color_dict[cl], alpha=alpha, **plot_kwargs)
+                lines.append(np.column_stack([x_sel, y_sel]))
+                line_colors.append(to_rgba(color, alpha))
                 
-            if show_dots and len(x_sel) > 0:
-                ax.plot(x_sel[-1], y_sel[-1], c=color_dict[cl], alpha=alpha, **dot_kwargs)
-            if len(x_sel) > 0:
-                alpha -= alpha_decay
+            if show_dots:
+                ax.plot(x_sel[-1], y_sel[-1], c=color, alpha=alpha, **dot_kwargs)
+            alpha -= alpha_decay
+        
+        # draw all lines as one collection, unless plot_kwargs use Line2D
+        # properties that a LineCollection doesn't share (e.g. markers)
+        if COLLECTION_LINE_KWARGS.issuperset(plot_kwargs):
+            ax.add_collection(LineCollection(lines, colors=line_colors, **plot_kwargs))
+        else:
+            for line, color in zip(lines, line_colors):
+                line = np.asarray(line)
+                ax.plot(line[:, 0], line[:, 1], c=color, **plot_kwargs)
+        if len(arrows) > 0:
+            ax.add_collection(PatchCollection(arrows, match_original=True))
+        ax.autoscale_view()
         
         # define the values for our legend
         color_dict = {key:val for key, val in color_dict.items() if key in segments[1]}
@@ -265,7 +315,12 @@ def plot_nslr_segmentation(time_array, gaze_array, segmentation, seg_class, tria
     f.suptitle(title)  # , fontsize=16)
 
     # the limits are defined as 2 std devs from mean
-    y_lims = np.array(gaze_array).std(axis=0) * 2
+    y_lims = np.asarray(gaze_array).std(axis=0) * 2
+
+    # convert the segments within the recording once for both axes
+    inner_segs = [(seg.t, np.asarray(seg.x), COLORS[cls])
+                  for seg, cls in zip(segmentation.segments, seg_class)
+                  if (seg.t[0] > time_array[0]) and (seg.t[1] < time_array[-1])]
 
     for idx, ax in enumerate(axes):
 
@@ -278,23 +333,23 @@ def plot_nslr_segmentation(time_array, gaze_array, segmentation, seg_class, tria
 
 
         ax.plot(time_array, gaze_array[:,idx], '.')
-        if not isinstance(stimulus, type(None)):
+        if stimulus is not None:
             st_id = ["X_Position", "Y_Position"]
             ax.plot(stimulus["Timestamp"].to_numpy(), stimulus[st_id[idx]].to_numpy(), "--", color="lightblue")
 
-        for i, seg in enumerate(segmentation.segments):
-            cls = seg_class[i]
-            if (seg.t[0] > time_array[0]) and (seg.t[1] < time_array[-1]): 
-                ax.plot(seg.t, np.array(seg.x)[:, idx], color=COLORS[cls])
+        for seg_t, seg_x, color in inner_segs:
+            ax.plot(seg_t, seg_x[:, idx], color=color)
 
-    if trial_info != None and len(trial_info) > 0:
+    if trial_info is not None and len(trial_info) > 0:
         y_pos = - y_lims[1] * 0.95  # min([i[0] for i in gaze_array])
         x_pos = (time_array[-1] - time_array[1]) / 150
 
-        for key in trial_info:
-            axes[0].axvline(x=float(key), linestyle="--")
-            axes[1].axvline(x=float(key), linestyle="--")
-            axes[1].text(float(key) + x_pos, y_pos,
+        # add the vertical bars for all trial events as one collection per axis
+        event_times = np.array([float(key) for key in trial_info])
+        for ax in axes:
+            _add_event_lines(ax, event_times)
+        for time, key in zip(event_times, trial_info):
+            axes[1].text(time + x_pos, y_pos,
                          "Event: {}".format(trial_info[key]), rotation=90,
                          verticalalignment='bottom', color='#1f77b4')  #, weight="bold")
 
@@ -305,7 +360,7 @@ def plot_nslr_segmentation(time_array, gaze_array, segmentation, seg_class, tria
     plt.legend(leg_artists, leg_indicators, loc="lower right", title="Gaze Classification")
     
         
-    if not isinstance(stimulus, type(None)):
+    if stimulus is not None:
         leg_artists = leg_artists + [plt.Line2D((0,1),(0,0),  linestyle='--', color="lightblue")]
         leg_indicators = leg_indicators + ["Stimulus data"]
         
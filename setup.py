@@ -3,7 +3,8 @@ from setuptools import setup
 
 # Utility function to read the README file.
 def read(fname):
-    return open(os.path.join(os.path.dirname(__file__), fname)).read()
+    with open(os.path.join(os.path.dirname(__file__), fname), encoding="utf-8") as f:
+        return f.read()
 
 setup(
     name = "cateyes",
@@ -17,7 +18,9 @@ setup(
     url = "https://github.com/DiGyt/cateyes",
     packages=['cateyes'],
     include_package_data=True,
+    package_data={"cateyes": ["data/*.csv"]},
     long_description=read('README.md'),
+    long_description_content_type="text/markdown",
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Topic :: Utilities",
@@ -0,0 +1,204 @@
+import numpy as np
+import pytest
+
+from remodnav.clf import EyegazeClassifier
+from cateyes.classification import (classify_dispersion, classify_velocity,
+                                    classify_remodnav, classify_many,
+                                    _preproc_cache_file, _nslr_class_table,
+                                    CLASSES)
+
+
+def _baseline_dispersion(x, y, threshold, n_samples):
+    """Reference I-DT implementation (the original cateyes window loop)."""
+    def _disp(win_x, win_y):
+        return (np.max(win_x) - np.min(win_x)) + (np.max(win_y) - np.min(win_y))
+
+    segments = np.zeros(len(x), dtype=int)
+    classes = np.empty(len(x), dtype=object)
+    classes[0:] = "Saccade"
+    i_start = 0
+    i_stop = n_samples
+    seg_idx = 0
+    while i_stop <= len(x):
+        win_x = x[i_start:i_stop]
+        win_y = y[i_start:i_stop]
+        if _disp(win_x, win_y) <= threshold:
+            seg_idx += 1
+            while _disp(win_x, win_y) <= threshold and i_stop < len(x):
+                i_stop += 1
+                win_x = x[i_start:i_stop]
+                win_y = y[i_start:i_stop]
+            classes[i_start:i_stop] = "Fixation"
+            segments[i_start:i_stop] = seg_idx
+            i_start = i_stop
+            i_stop = i_stop + n_samples
+            seg_idx += 1
+        else:
+            segments[i_start:i_stop] = seg_idx
+            i_start += 1
+            i_stop = i_start + n_samples
+    return segments, classes
+
+
+def _random_trace(rng, n=400, nan_prob=0.02):
+    """Random gaze trace of fixation plateaus and jumps, with NaN blinks."""
+    steps = rng.normal(0, 0.1, (2, n))
+    jumps = rng.random(n) < 0.05
+    steps[:, jumps] += rng.normal(0, 5, (2, jumps.sum()))
+    x, y = np.cumsum(steps, axis=1)
+    blinks = rng.random(n) < nan_prob
+    x[blinks] = np.nan
+    y[rng.random(n) < nan_prob / 2] = np.nan
+    return x, y
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_classify_dispersion_matches_baseline_with_nans(seed):
+    rng = np.random.default_rng(seed)
+    x, y = _random_trace(rng)
+    sfreq, window_len = 100., 0.05
+    threshold = rng.uniform(0.2, 2.)
+    n_samples = int(sfreq * window_len)
+
+    segments, classes = classify_dispersion(x, y, sfreq, threshold, window_len)
+    ref_segments, ref_classes = _baseline_dispersion(x, y, threshold, n_samples)
+
+    np.testing.assert_array_equal(segments, ref_segments)
+    np.testing.assert_array_equal(classes, ref_classes)
+
+
+def _velocity_trials(n_trials=4, n=500):
+    rng = np.random.default_rng(0)
+    xs = [np.cumsum(rng.normal(0, 0.5, n)) for _ in range(n_trials)]
+    ys = [np.cumsum(rng.normal(0, 0.5, n)) for _ in range(n_trials)]
+    return xs, ys
+
+
+def test_classify_many_pool_matches_sequential():
+    xs, ys = _velocity_trials()
+    sequential = classify_many(classify_velocity, xs, ys, 500., n_jobs=None,
+                               threshold=400)
+    pooled = classify_many(classify_velocity, xs, ys, 500., n_jobs=2,
+                           threshold=400)
+    assert len(sequential) == len(pooled) == len(xs)
+    for (seg, cls), (seg_p, cls_p), x, y in zip(sequential, pooled, xs, ys):
+        ref_seg, ref_cls = classify_velocity(x, y, 500., threshold=400)
+        np.testing.assert_array_equal(seg, ref_seg)
+        np.testing.assert_array_equal(cls, ref_cls)
+        np.testing.assert_array_equal(seg_p, ref_seg)
+        np.testing.assert_array_equal(cls_p, ref_cls)
+
+
+def test_classify_many_checks_arguments():
+    xs, ys = _velocity_trials()
+    with pytest.raises(ValueError, match="same length"):
+        classify_many(classify_velocity, xs, ys[:-1], 500., threshold=400)
+    with pytest.raises(ValueError, match="same length"):
+        classify_many(classify_velocity, xs, ys, [500.] * 3, threshold=400)
+    for n_jobs in [0, -2, 1.5]:
+        with pytest.raises(ValueError, match="n_jobs"):
+            classify_many(classify_velocity, xs, ys, 500., n_jobs=n_jobs,
+                          threshold=400)
+
+
+def _remodnav_trace(sfreq=500., duration=10.):
+    """Random gaze trace (in degrees) of fixations joined by saccades."""
+    rng = np.random.default_rng(1)
+    n = int(sfreq * duration)
+    steps = rng.normal(0, 0.005, (2, n))
+    for start in range(100, n - 10, 250):
+        steps[:, start:start + 10] += rng.normal(0, 0.3, (2, 1))
+    x, y = np.cumsum(steps, axis=1)
+    return x, y, sfreq
+
+
+def test_classify_remodnav_cache_matches_uncached(tmp_path, monkeypatch):
+    x, y, sfreq = _remodnav_trace()
+    uncached = classify_remodnav(x, y, sfreq, px2deg=1.)
+    first = classify_remodnav(x, y, sfreq, px2deg=1., cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+    # the second run must load the preprocessed data from the cache
+    def _fail(*args, **kwargs):
+        raise AssertionError("preprocessing was not cached")
+    monkeypatch.setattr(EyegazeClassifier, "preproc", _fail)
+    cached = classify_remodnav(x, y, sfreq, px2deg=1., cache_dir=str(tmp_path))
+
+    for result in [first, cached]:
+        np.testing.assert_array_equal(result[0], uncached[0])
+        np.testing.assert_array_equal(result[1], uncached[1])
+
+
+def test_preproc_cache_key_hashes_full_arrays(tmp_path):
+    data = np.zeros(10)
+    params_a = np.zeros(5000)
+    params_b = params_a.copy()
+    params_b[2500] = 1.
+    assert "..." in repr(params_a)
+    file_a = _preproc_cache_file(str(tmp_path), data, [("filter", params_a)])
+    file_b = _preproc_cache_file(str(tmp_path), data, [("filter", params_b)])
+    assert file_a != file_b
+    assert file_a == _preproc_cache_file(str(tmp_path), data,
+                                         [("filter", params_a.copy())])
+
+
+def test_interrupted_cache_write_leaves_no_file(tmp_path, monkeypatch):
+    x, y, sfreq = _remodnav_trace()
+
+    def _interrupted_save(f, array):
+        f.write(b"\x93NUMPY")
+        raise KeyboardInterrupt
+    monkeypatch.setattr(np, "save", _interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        classify_remodnav(x, y, sfreq, px2deg=1., cache_dir=str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+
+
+def _baseline_velocity(x, y, times, threshold):
+    """Reference I-VT implementation (the original linalg.norm version)."""
+    sfreq = 1 / np.mean(times[1:] - times[:-1])
+    sample_thresh = threshold / sfreq
+    gaze = np.stack([x, y])
+    vels = np.linalg.norm(gaze[:, 1:] - gaze[:, :-1], axis=0)
+    vels = np.concatenate([[0.], vels])
+    classes = np.empty(len(x), dtype=object)
+    classes[:] = "Fixation"
+    classes[vels > sample_thresh] = "Saccade"
+    segments = np.zeros(len(x), dtype=int)
+    for idx in range(1, len(classes)):
+        if classes[idx] == classes[idx - 1]:
+            segments[idx] = segments[idx - 1]
+        else:
+            segments[idx] = segments[idx - 1] + 1
+    return segments, classes
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_classify_velocity_matches_baseline(seed):
+    rng = np.random.default_rng(seed)
+    n = rng.integers(2, 1000)
+    x = np.cumsum(rng.normal(0, 0.5, n))
+    y = np.cumsum(rng.normal(0, 0.5, n))
+    threshold = rng.uniform(50, 500)
+    times = np.arange(n) / 500.
+    ref_segments, ref_classes = _baseline_velocity(x, y, times, threshold)
+
+    for time in [500., times]:
+        segments, classes = classify_velocity(x, y, time, threshold)
+        np.testing.assert_array_equal(segments, ref_segments)
+        np.testing.assert_array_equal(classes, ref_classes)
+
+    # the discrete output lists the first sample of every segment
+    dis_segments, dis_classes = classify_velocity(x, y, times, threshold,
+                                                  return_discrete=True)
+    starts = np.flatnonzero(np.diff(ref_segments, prepend=-1))
+    np.testing.assert_array_equal(dis_segments, times[starts])
+    np.testing.assert_array_equal(dis_classes, ref_classes[starts])
+
+
+def test_nslr_class_table_names_every_code():
+    codes = [code for code in CLASSES if code is not None]
+    np.testing.assert_array_equal(_nslr_class_table(codes + [None]),
+                                  [CLASSES[code] for code in codes] + ["None"])
+    with pytest.raises(KeyError):
+        _nslr_class_table([max(codes) + 1])
@@ -0,0 +1,184 @@
+import numpy as np
+import pytest
+
+from cateyes.utils import (_get_time, _cached_times, sfreq_to_times, coords_to_degree,
+                           discrete_to_continuous, continuous_to_discrete,
+                           pixel_to_degree)
+
+
+def test_get_time_from_sfreq_is_shared_and_read_only():
+    x = np.zeros(1000)
+    times, sfreq = _get_time(x, 500)
+    assert sfreq == 500.
+    np.testing.assert_allclose(times, sfreq_to_times(x, 500))
+    assert not times.flags.writeable
+    assert _get_time(x, 500)[0] is times
+
+    # only the latest times array is kept alive
+    _get_time(np.zeros(10), 500)
+    assert _cached_times.cache_info().currsize == 1
+    assert _get_time(x, 500)[0] is not times
+
+
+def test_coords_to_degree_shapes():
+    expected = np.degrees(np.arctan2(5. - 50., 60.))
+    np.testing.assert_allclose(coords_to_degree(5., 60, 100), expected)
+    np.testing.assert_allclose(coords_to_degree([5., 5.], 60, 100), [expected] * 2)
+    np.testing.assert_allclose(coords_to_degree([[5.], [5.]], 60, [100, 100]),
+                               [[expected], [expected]])
+
+
+def test_get_time_needs_two_sampling_times():
+    for time in [[], [0.5]]:
+        with pytest.raises(ValueError, match="two sampling times"):
+            _get_time(np.zeros(len(time)), time)
+
+
+@pytest.mark.parametrize("values", [['Fixation', 1, 'Saccade'], [1, 2.5, 3],
+                                    ['Fixation', 'Saccade', 'Fixation'],
+                                    [(1, 2), (3, 4), (1, 2)]])
+def test_discrete_to_continuous_keeps_value_objects(values):
+    times = np.array([0., 0.1, 0.2])
+    # once with every sample as an event (identity path), once in general
+    for dis_times in [times, times + 0.05]:
+        indices, out = discrete_to_continuous(times, dis_times, values)
+        if dis_times is times:
+            np.testing.assert_array_equal(indices, [1, 2, 3])
+            expected = values
+        else:
+            np.testing.assert_array_equal(indices, [0, 1, 2])
+            expected = [None] + values[:2]
+        assert list(out) == expected
+        if all(isinstance(val, str) for val in expected):
+            assert out.dtype.kind == "U"
+        else:
+            assert out.dtype.kind == "O"
+            assert [type(val) for val in out] == [type(val) for val in expected]
+
+
+def test_discrete_to_continuous_keeps_equal_values_of_different_types():
+    times = np.array([0., 1., 1.5, 2.])
+    indices, values = discrete_to_continuous(times, [0, 1, 1.5], [1, True, 1.0])
+    np.testing.assert_array_equal(indices, [1, 2, 3, 3])
+    assert [type(val) for val in values] == [int, bool, float, float]
+
+
+def test_pixel_to_degree_checks_screen_size():
+    x2d = np.array([[0., 960., 1920.], [0., 540., 1080.]])
+    with pytest.raises(ValueError, match="screen_size"):
+        pixel_to_degree(x2d, 60, 50, [1920, 1080])
+    with pytest.raises(ValueError, match="screen_size"):
+        pixel_to_degree(x2d, 60, [50], [1920, 1080])
+    with pytest.raises(ValueError, match="screen_size"):
+        pixel_to_degree(np.array([0., 960.]), 60, [50, 30], 1920)
+
+
+def _baseline_discrete_to_continuous(times, discrete_times, discrete_values):
+    """Reference implementation (the original cateyes mask loop)."""
+    time_val_sorted = sorted(zip(discrete_times, discrete_values))
+    indices = np.zeros(len(times))
+    values = np.empty(len(times), dtype=object)
+    for idx, (dis_time, dis_val) in enumerate(time_val_sorted):
+        selected = times >= dis_time
+        indices[selected] = idx + 1
+        values[selected] = dis_val
+    return indices, values
+
+
+def _baseline_continuous_to_discrete(times, indices, values):
+    """Reference implementation (the original cateyes per-sample loop)."""
+    discrete_times = []
+    discrete_values = []
+    cur_idx = np.min(indices) - 1
+    for time, idx, val in zip(times, indices, values):
+        if idx > cur_idx:
+            discrete_times.append(time)
+            discrete_values.append(val)
+        cur_idx = idx
+    return discrete_times, discrete_values
+
+
+def _random_events(rng, times, n_events, labels):
+    """Unsorted events with unique times, partly before the first sample."""
+    span = times[-1] - times[0]
+    dis_times = rng.choice(np.linspace(times[0] - 0.2 * span, times[-1] + 0.1,
+                                       10 * n_events), n_events, replace=False)
+    dis_values = [labels[i] for i in rng.integers(0, len(labels), n_events)]
+    return dis_times, dis_values
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("labels", [["Fixation", "Saccade", "PSO"],
+                                    [1, 2.5, "Saccade", None]])
+def test_discrete_to_continuous_matches_baseline(seed, labels):
+    rng = np.random.default_rng(seed)
+    times = np.sort(rng.uniform(0, 10, rng.integers(1, 200)))
+    dis_times, dis_values = _random_events(rng, times, rng.integers(1, 20), labels)
+
+    indices, values = discrete_to_continuous(times, dis_times, dis_values)
+    ref_indices, ref_values = _baseline_discrete_to_continuous(times, dis_times,
+                                                               dis_values)
+    np.testing.assert_array_equal(indices, ref_indices)
+    assert list(values) == list(ref_values)
+
+    # string labels are packed to a string array if no sample precedes them
+    packed = (all(isinstance(val, str) for val in dis_values)
+              and ref_indices[0] > 0)
+    assert values.dtype.kind == ("U" if packed else "O")
+
+
+def test_discrete_to_continuous_identity_matches_baseline():
+    times = np.arange(10) / 10.
+    dis_values = ["Fixation", "Saccade"] * 5
+    indices, values = discrete_to_continuous(times, times.copy(), dis_values)
+    ref_indices, ref_values = _baseline_discrete_to_continuous(times, times,
+                                                               dis_values)
+    np.testing.assert_array_equal(indices, ref_indices)
+    assert list(values) == list(ref_values)
+    assert values.dtype.kind == "U"
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_continuous_to_discrete_matches_baseline(seed):
+    rng = np.random.default_rng(seed)
+    n = rng.integers(1, 300)
+    times = np.sort(rng.uniform(0, 10, n))
+    indices = np.cumsum(rng.random(n) < 0.1) + rng.integers(0, 3)
+    values = np.array(["Fixation", "Saccade", 1, None], dtype=object)[indices % 4]
+
+    dis_times, dis_values = continuous_to_discrete(times, indices, values)
+    ref_times, ref_values = _baseline_continuous_to_discrete(times, indices, values)
+    assert dis_times == ref_times
+    assert dis_values == ref_values
+
+
+def _baseline_pixel_to_degree(x, viewing_dist, screen_size, screen_res):
+    """Reference conversion (the original cateyes formula)."""
+    screen_size = np.array(screen_size).reshape(-1, 1)
+    x = np.array(x) / np.array(screen_res).reshape(-1, 1) * screen_size
+    return np.degrees(np.arctan2(x - screen_size / 2., viewing_dist))
+
+
+def test_pixel_to_degree_matches_baseline():
+    rng = np.random.default_rng(0)
+    x2d = rng.uniform(0, 1920, (2, 100))
+    np.testing.assert_allclose(pixel_to_degree(x2d, 60, [53, 30], [1920, 1080]),
+                               _baseline_pixel_to_degree(x2d, 60, [53, 30],
+                                                         [1920, 1080]))
+
+    # 1D gaze arrays keep their shape (the original returned shape (1, N))
+    for size, res in [(53, 1920), ([53], [1920])]:
+        deg = pixel_to_degree(x2d[0], 60, size, res)
+        assert deg.shape == x2d[0].shape
+        np.testing.assert_allclose(deg, _baseline_pixel_to_degree(x2d[0], 60,
+                                                                  size, res)[0])
+
+
+def test_pixel_to_degree_checks_screen_res():
+    x2d = np.zeros((2, 10))
+    with pytest.raises(ValueError, match="screen_res"):
+        pixel_to_degree(x2d, 60, [53, 30], 1920)
+    with pytest.raises(ValueError, match="screen_res"):
+        pixel_to_degree(x2d, 60, [53, 30], [1920, 1080, 1])
+    with pytest.raises(ValueError, match="screen_res"):
+        pixel_to_degree(x2d[0], 60, 53, [1920, 1080])
@@ -0,0 +1,49 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from matplotlib.collections import LineCollection
+from cateyes.visualization import plot_trajectory, plot_segmentation
+
+
+def _trajectory_data():
+    times = np.arange(20) / 10.
+    x = np.linspace(0, 1, 20)
+    y = np.sin(x)
+    segments = ([0., 0.5, 1.0, 1.5, 2.0],
+                ["Fixation", "Saccade", "Smooth Pursuit", "Fixation", "Fixation"])
+    return x, y, times, segments
+
+
+@pytest.mark.parametrize("plot_kwargs", [{}, {"lw": 2}, {"marker": "."},
+                                         {"marker": ".", "markersize": 3}])
+def test_plot_trajectory_accepts_plot_kwargs(plot_kwargs):
+    x, y, times, segments = _trajectory_data()
+    fig, ax = plt.subplots()
+    plot_trajectory(x, y, times, segments=segments, ax=ax, show_arrows=False,
+                    plot_kwargs=plot_kwargs)
+
+    # Line2D-only properties are drawn per segment, others as one collection
+    collections = [c for c in ax.collections if isinstance(c, LineCollection)]
+    if "marker" in plot_kwargs:
+        assert len(collections) == 0
+        assert all(line.get_marker() == "." for line in ax.lines)
+        assert len(ax.lines) == 4
+    else:
+        assert len(collections) == 1
+        assert len(collections[0].get_segments()) == 4
+    plt.close(fig)
+
+
+def test_plot_segmentation_draws_event_text():
+    times = np.arange(20) / 10.
+    gaze = np.sin(times)
+    segments = ([0., 1.0, 2.0], ["Fixation", "Saccade", "Fixation"])
+    events = ([0.5, 1.5], ["Stimulus", "Response"])
+    fig, ax = plt.subplots()
+    plot_segmentation(gaze, times, segments=segments, events=events, ax=ax)
+    fig.canvas.draw()
+    assert [text.get_text() for text in ax.texts] == [" Stimulus", " Response"]
+    plt.close(fig)